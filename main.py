@@ -1,13 +1,31 @@
 import os
 import sys
+import io
+import re
+import mmap
+import json
+import hashlib
+import time
+import socket
 import shutil
+import asyncio
+import argparse
+import functools
+import itertools
+import tempfile
+import urllib.parse
 import threading
+import multiprocessing
+import signal
+from multiprocessing import connection as mp_connection
 import queue
 import traceback
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import dataclasses
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Callable, Iterator, List, Optional, Tuple
 
 try:
     from PyQt5.QtWidgets import (
@@ -16,7 +34,7 @@ try:
         QLineEdit, QTextEdit, QFileDialog, QMessageBox, QGroupBox,
         QSplitter, QTabWidget, QTreeWidget, QTreeWidgetItem, QComboBox
     )
-    from PyQt5.QtCore import QThread, pyqtSignal, Qt, QUrl
+    from PyQt5.QtCore import QObject, QThread, pyqtSignal, Qt, QUrl
     from PyQt5.QtGui import QFont, QDragEnterEvent, QDropEvent, QPixmap
     QT_AVAILABLE = True
 except Exception:  # Missing PyQt5
@@ -196,20 +214,330 @@ def extract_exif_info(file_path: Path) -> dict:
     return info
 
 
+EXIF_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+class BoundedLRUCache:
+    """Thread-safe LRU cache bounded by the approximate total size of its values."""
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[object], int]):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._items: "OrderedDict[object, Tuple[object, int]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value) -> None:
+        size = self._sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self._total += size
+            while self._total > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._total -= evicted
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._items
+
+
+def _exif_info_size(info: dict) -> int:
+    return sum(len(str(k)) + len(str(v)) for k, v in info.items()) * 2 + 64
+
+
+def _file_stamp(file_path: Path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) so edited files are detected; None if the file is gone.
+
+    Caches are keyed by path and store (stamp, value): the GUI thread looks up by path
+    without touching the file system, loader threads stat() and revalidate.
+    """
+    try:
+        st = file_path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+THUMBNAIL_SIZE = 320
+THUMBNAIL_MEMORY_CACHE_BYTES = 16 * 1024 * 1024
+THUMBNAIL_DISK_CACHE_BYTES = 256 * 1024 * 1024
+THUMBNAIL_KEY_SAMPLE = 64 * 1024
+THUMBNAIL_KEY_FULL_HASH_MAX = 8 * 1024 * 1024  # 不超过该大小的文件对全部内容求哈希
+
+
+def _app_cache_dir() -> Path:
+    """Per-user cache directory for ClearMeta."""
+    if os.name == "nt":
+        base = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform.startswith("darwin"):
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "ClearMeta"
+
+
+def _thumbnail_disk_key(file_path: Path, max_size: int) -> str:
+    """Disk cache key for a thumbnail of *file_path*.
+
+    Files up to THUMBNAIL_KEY_FULL_HASH_MAX are hashed in full, so the key survives
+    renames/moves. Larger files hash size, mtime and the first and last 64 KiB:
+    sampling alone would miss a same-size edit in the middle of an uncompressed
+    BMP/TIFF, so the mtime is what invalidates those.
+    """
+    h = hashlib.sha1()
+    st = file_path.stat()
+    with open(file_path, "rb") as fh:
+        if st.st_size <= THUMBNAIL_KEY_FULL_HASH_MAX:
+            h.update(f"full:{max_size}:".encode())
+            for block in iter(functools.partial(fh.read, 1024 * 1024), b""):
+                h.update(block)
+        else:
+            h.update(f"sample:{st.st_size}:{st.st_mtime_ns}:{max_size}:".encode())
+            h.update(fh.read(THUMBNAIL_KEY_SAMPLE))
+            fh.seek(-THUMBNAIL_KEY_SAMPLE, os.SEEK_END)
+            h.update(fh.read(THUMBNAIL_KEY_SAMPLE))
+    return h.hexdigest()
+
+
+def render_thumbnail(file_path: Path, max_size: int = THUMBNAIL_SIZE) -> bytes:
+    """Decode a downscaled preview of *file_path* and return it as JPEG/PNG bytes."""
+    with Image.open(str(file_path)) as im:
+        # JPEG: 让解码器直接在 DCT 域按 1/2、1/4、1/8 缩小，大图只解码需要的分辨率
+        im.draft("RGB", (max_size, max_size))
+        # 其他格式先用 reduce() 做整数倍缩小，再做高质量重采样
+        im.thumbnail((max_size, max_size), Image.LANCZOS, reducing_gap=2.0)
+        # 缩小后再按 EXIF 方向旋转，避免对全尺寸图像做一次转置拷贝
+        im = ImageOps.exif_transpose(im)
+        buf = io.BytesIO()
+        if im.mode in ("RGBA", "LA", "P"):
+            im.convert("RGBA").save(buf, "PNG")
+        else:
+            im.convert("RGB").save(buf, "JPEG", quality=85)
+        return buf.getvalue()
+
+
+class ThumbnailCache:
+    """On-disk thumbnail cache keyed by _thumbnail_disk_key, evicting least recently used files by total size."""
+
+    def __init__(self, directory: Path, max_bytes: int = THUMBNAIL_DISK_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.thumb"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(str(path), None)  # mtime 作为最近使用时间
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, _, size in self._scan())
+            else:
+                self._total += len(data)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> List[Tuple[float, Path, int]]:
+        entries = []
+        for p in self.directory.glob("*/*.thumb"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, p, st.st_size))
+        return entries
+
+    def _evict(self) -> None:
+        # 一次清到上限的 90%，避免每次写入都触发全量扫描
+        entries = sorted(self._scan())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for _, p, size in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                pass
+        self._total = total
+
+
 def _has_exiftool() -> Optional[str]:
 	"""Return exiftool path if available, else None."""
-	return shutil.which("exiftool")
+	return probe_capabilities().exiftool
 
 
 def _has_ffmpeg() -> Optional[str]:
 	"""Return ffmpeg path if available, else None."""
-	return shutil.which("ffmpeg")
+	return probe_capabilities().ffmpeg
+
+
+def _has_jpegtran() -> Optional[str]:
+	"""Return jpegtran path if available, else None."""
+	return probe_capabilities().jpegtran
+
+
+# EXIF Orientation -> jpegtran 无损变换参数
+JPEGTRAN_ORIENTATION_ARGS = {
+	2: ["-flip", "horizontal"],
+	3: ["-rotate", "180"],
+	4: ["-flip", "vertical"],
+	5: ["-transpose"],
+	6: ["-rotate", "90"],
+	7: ["-transverse"],
+	8: ["-rotate", "270"],
+}
+
+JPEG_HEADER_SCAN_BYTES = 256 * 1024  # APPn 段都在 SOS 之前，读文件头即可
+
+
+def _iter_jpeg_segments(data: bytes) -> Iterator[Tuple[int, bytes]]:
+	"""Yield (marker, payload) for each JPEG header segment up to SOS."""
+	if not data.startswith(b"\xff\xd8"):
+		return
+	pos = 2
+	while pos + 4 <= len(data):
+		if data[pos] != 0xFF:
+			return
+		marker = data[pos + 1]
+		if marker == 0xFF:  # 填充字节
+			pos += 1
+			continue
+		if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # 无长度字段的标记
+			pos += 2
+			continue
+		length = int.from_bytes(data[pos + 2:pos + 4], "big")
+		yield marker, data[pos + 4:pos + 2 + length]
+		if marker == 0xDA:  # SOS 之后是熵编码数据
+			return
+		pos += 2 + length
+
+
+def _exif_orientation(tiff: bytes) -> int:
+	"""Read the Orientation tag from a TIFF/EXIF blob; 1 if absent or malformed."""
+	if tiff[:2] == b"II":
+		order = "little"
+	elif tiff[:2] == b"MM":
+		order = "big"
+	else:
+		return 1
+	try:
+		ifd = int.from_bytes(tiff[4:8], order)
+		count = int.from_bytes(tiff[ifd:ifd + 2], order)
+		for i in range(count):
+			entry = ifd + 2 + i * 12
+			if int.from_bytes(tiff[entry:entry + 2], order) == 0x0112:
+				value = int.from_bytes(tiff[entry + 8:entry + 10], order)
+				return value if 1 <= value <= 8 else 1
+	except Exception:
+		pass
+	return 1
+
+
+def _jpeg_orientation(path: Path) -> int:
+	"""Return the EXIF Orientation (1-8) of a JPEG file by scanning its header only."""
+	try:
+		with open(path, "rb") as fh:
+			head = fh.read(JPEG_HEADER_SCAN_BYTES)
+	except OSError:
+		return 1
+	for marker, payload in _iter_jpeg_segments(head):
+		if marker == 0xE1 and payload.startswith(b"Exif\x00\x00"):
+			return _exif_orientation(payload[6:])
+	return 1
+
+
+def _jpegtran_normalize(input_path: Path, output_path: Path, orientation: int, timeout: float = 60) -> Tuple[bool, str]:
+	"""Losslessly apply *orientation* to a JPEG with jpegtran, dropping all metadata segments.
+
+	``-perfect`` makes jpegtran fail instead of trimming edge blocks, so the output is
+	either an exact DCT-domain transform or nothing at all.
+	"""
+	jpegtran = _has_jpegtran()
+	if not jpegtran:
+		return False, "jpegtran not found"
+
+	import subprocess
+	_ensure_parent_dir(output_path)
+	# 先写临时文件再替换，覆盖模式下输入输出是同一个文件
+	tmp_path = _tool_temp_path(output_path, "jpegtran")
+	cmd = [jpegtran, "-copy", "none", "-perfect", "-optimize"] + JPEGTRAN_ORIENTATION_ARGS.get(orientation, []) + [
+		"-outfile", str(tmp_path), str(input_path)
+	]
+	try:
+		result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+	except subprocess.TimeoutExpired:
+		tmp_path.unlink(missing_ok=True)
+		return False, "jpegtran处理超时"
+	except Exception as e:
+		tmp_path.unlink(missing_ok=True)
+		return False, f"jpegtran异常: {str(e)}"
+
+	if result.returncode != 0:
+		tmp_path.unlink(missing_ok=True)
+		return False, f"jpegtran错误: {result.stderr}"
+	os.replace(tmp_path, output_path)
+	return True, "jpegtran无损校正方向"
 
 
 def _ensure_parent_dir(path: Path) -> None:
 	path.parent.mkdir(parents=True, exist_ok=True)
 
 
+# 外部工具先写到输出旁的隐藏临时文件再替换；工作进程被看门狗终止时这些文件会残留
+TOOL_TEMP_KINDS = ("jpegtran", "exiftool", "ffbatch")
+_TOOL_TEMP_NAME = re.compile(r"^\..+\.(?:%s)\.tmp\.[^.]+$|^\..+\.copy\.tmp$" % "|".join(TOOL_TEMP_KINDS))
+
+
+def _tool_temp_path(output_path: Path, kind: str) -> Path:
+	return output_path.with_name(f".{output_path.stem}.{kind}.tmp{output_path.suffix}")
+
+
+def _remove_tool_temps(output_path: Path) -> None:
+	"""Delete every temp file an engine may have left next to *output_path*."""
+	leftovers = [_tool_temp_path(output_path, kind) for kind in TOOL_TEMP_KINDS]
+	leftovers += [output_path.with_name(f".{output_path.name}.copy.tmp"), output_path.with_suffix(".tmp.png")]
+	for path in leftovers:
+		try:
+			path.unlink(missing_ok=True)
+		except OSError:
+			pass
+
+
 def _clean_png_info_thoroughly(file_path: Path) -> None:
 	"""专门用于彻底清理 PNG 文件的 pnginfo 和文本块"""
 	try:
@@ -233,7 +561,39 @@ def _clean_png_info_thoroughly(file_path: Path) -> None:
 		pass
 
 
-def _ffmpeg_clean_metadata(input_path: Path, output_path: Path, output_format: str = "原格式") -> Tuple[bool, str]:
+def _output_path_with_format(output_path: Path, output_format: str) -> Path:
+	"""Adjust the output suffix for a format conversion."""
+	if output_format == "JPG":
+		return output_path.with_suffix('.jpg')
+	if output_format == "PNG":
+		return output_path.with_suffix('.png')
+	return output_path
+
+
+def _ffmpeg_codec_params(input_path: Path, output_format: str) -> List[str]:
+	"""FFmpeg encoder arguments for one output."""
+	if output_format == "JPG":
+		return ["-c:v", "mjpeg", "-q:v", "2"]  # 高质量JPEG
+	if output_format == "PNG":
+		# PNG 特殊处理：重新编码而不是复制，确保移除所有文本块和元数据
+		return ["-c:v", "png", "-compression_level", "6"]
+	# 原格式
+	ext = input_path.suffix.lower()
+	if ext in ['.jpg', '.jpeg']:
+		return ["-c:v", "copy"]  # 保持原始质量
+	if ext == '.png':
+		# PNG 原格式也要确保彻底清理元数据
+		return ["-c:v", "png", "-compression_level", "6"]
+	if ext == '.webp':
+		return ["-c:v", "libwebp", "-quality", "95"]
+	if ext in ['.tif', '.tiff']:
+		return ["-c:v", "tiff", "-compression_algo", "lzw"]
+	if ext == '.bmp':
+		return ["-c:v", "bmp"]
+	return ["-c:v", "copy"]
+
+
+def _ffmpeg_clean_metadata(input_path: Path, output_path: Path, output_format: str = "原格式", timeout: float = 60) -> Tuple[bool, str]:
 	"""Use FFmpeg to clean metadata from image files with optional format conversion."""
 	ffmpeg = _has_ffmpeg()
 	if not ffmpeg:
@@ -241,54 +601,26 @@ def _ffmpeg_clean_metadata(input_path: Path, output_path: Path, output_format: s
 	
 	try:
 		import subprocess
+		output_path = _output_path_with_format(output_path, output_format)
 		_ensure_parent_dir(output_path)
 		
-		# 根据输出格式调整输出路径和编码参数
-		if output_format == "JPG":
-			output_path = output_path.with_suffix('.jpg')
-			codec_params = ["-c:v", "mjpeg", "-q:v", "2"]  # 高质量JPEG
-		elif output_format == "PNG":
-			output_path = output_path.with_suffix('.png')
-			# PNG 特殊处理：确保移除所有文本块和元数据
-			codec_params = ["-c:v", "png", "-compression_level", "6"]
-		else:  # 原格式
-			ext = input_path.suffix.lower()
-			if ext in ['.jpg', '.jpeg']:
-				codec_params = ["-c:v", "copy"]  # 保持原始质量
-			elif ext == '.png':
-				# PNG 原格式也要确保彻底清理元数据
-				codec_params = ["-c:v", "png", "-compression_level", "6"]
-			elif ext == '.webp':
-				codec_params = ["-c:v", "libwebp", "-quality", "95"]
-			elif ext in ['.tif', '.tiff']:
-				codec_params = ["-c:v", "tiff", "-compression_algo", "lzw"]
-			elif ext == '.bmp':
-				codec_params = ["-c:v", "bmp"]
-			else:
-				codec_params = ["-c:v", "copy"]
-		
 		# 构建 FFmpeg 命令，特别针对 PNG 文件加强元数据清理
 		cmd = [
 			ffmpeg,
 			"-i", str(input_path),
 			"-map_metadata", "-1",  # 移除所有元数据
 			"-map", "0:v",  # 只保留视频流（图像数据）
-		] + codec_params + [
+		] + _ffmpeg_codec_params(input_path, output_format) + [
 			"-y",  # 覆盖输出文件
 			str(output_path)
 		]
 		
-		# 如果是 PNG 格式，添加额外的过滤器确保移除所有文本块
-		if output_format == "PNG" or input_path.suffix.lower() == '.png':
-			# 使用重新编码而不是复制，确保彻底清理
-			cmd[cmd.index("-c:v")+1] = "png"
-		
 		result = subprocess.run(
 			cmd, 
 			stdout=subprocess.PIPE, 
 			stderr=subprocess.PIPE, 
 			text=True,
-			timeout=60
+			timeout=timeout
 		)
 		
 		if result.returncode == 0:
@@ -303,6 +635,64 @@ def _ffmpeg_clean_metadata(input_path: Path, output_path: Path, output_format: s
 		return False, f"FFmpeg异常: {str(e)}"
 
 
+def _output_decodes(path: Path) -> bool:
+	"""Fully decode *path*; verify() alone accepts truncated JPEG scans."""
+	try:
+		if path.stat().st_size == 0:
+			return False
+		with Image.open(str(path)) as im:
+			im.load()
+		return True
+	except Exception:
+		return False
+
+
+def _ffmpeg_clean_batch(items: List[Tuple[Path, Path]], output_format: str, timeout: float) -> List[Tuple[bool, str]]:
+	"""Clean several images with a single FFmpeg process (one -i and one output per file).
+
+	*items* are (input, output) pairs with output suffixes already adjusted. Each output
+	is written to a temp file and only moved into place if it is usable, so a failed
+	invocation can be mapped back to the individual files that need a retry.
+	"""
+	ffmpeg = _has_ffmpeg()
+	if not ffmpeg:
+		return [(False, "FFmpeg not found")] * len(items)
+
+	import subprocess
+	temps = []
+	cmd = [ffmpeg, "-hide_banner", "-nostdin"]
+	for input_path, _ in items:
+		cmd += ["-i", str(input_path)]
+	for k, (input_path, output_path) in enumerate(items):
+		_ensure_parent_dir(output_path)
+		tmp_path = _tool_temp_path(output_path, "ffbatch")
+		tmp_path.unlink(missing_ok=True)
+		temps.append(tmp_path)
+		cmd += ["-map", f"{k}:v", "-map_metadata", "-1"] + _ffmpeg_codec_params(input_path, output_format) + ["-y", str(tmp_path)]
+
+	try:
+		result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+		batch_ok = result.returncode == 0
+		error = "" if batch_ok else f"FFmpeg批量错误: {result.stderr[-500:]}"
+	except subprocess.TimeoutExpired:
+		batch_ok, error = False, "FFmpeg批量处理超时"
+	except Exception as e:
+		batch_ok, error = False, f"FFmpeg异常: {str(e)}"
+
+	outcomes = []
+	for (_, output_path), tmp_path in zip(items, temps):
+		# 整体失败时，已完整写出且能完整解码的输出仍然可用，其余文件交给调用方单独重试
+		if tmp_path.exists() and (batch_ok or _output_decodes(tmp_path)):
+			os.replace(tmp_path, output_path)
+			if output_path.suffix.lower() == '.png':
+				_clean_png_info_thoroughly(output_path)
+			outcomes.append((True, "FFmpeg批量清理成功"))
+		else:
+			tmp_path.unlink(missing_ok=True)
+			outcomes.append((False, error or "FFmpeg未生成输出"))
+	return outcomes
+
+
 def _pil_resave_strip_metadata_with_format(inp: Path, outp: Path, output_format: str = "原格式") -> None:
 	"""Fallback: re-save via Pillow to drop metadata with optional format conversion."""
 	with Image.open(str(inp)) as im:
@@ -379,60 +769,649 @@ def _piexif_strip_if_needed(outp: Path) -> None:
 		pass
 
 
+# --------------------------- 引擎选择 ---------------------------
+#
+# 启动时探测一次外部工具的版本和 FFmpeg 编码器（结果按工具文件的 mtime/大小缓存到磁盘），
+# 再用一张很小的样图给每种 (输入格式, 输出格式) 计时各个引擎，校验输出确实无元数据，
+# 结果同样缓存到磁盘。清理时按“无损优先、其次最快”的顺序尝试引擎，失败再回退。
+
+ENGINE_LABELS = {"ffmpeg": "FFmpeg清理", "exiftool": "exiftool清理", "pillow": "Python清理"}
+DEFAULT_ENGINE_ORDER = ("ffmpeg", "exiftool", "pillow")
+CALIBRATION_EXTS = (".jpg", ".png", ".webp", ".tif", ".bmp")
+CALIBRATION_ROUNDS = 2  # 取最小值，第一轮通常包含冷启动
+
+# FFmpeg 输出各格式所需的编码器（JPEG 原格式使用 -c:v copy，无需编码器）
+FFMPEG_ENCODERS = {".jpg": "mjpeg", ".jpeg": "mjpeg", ".png": "png", ".webp": "libwebp", ".tif": "tiff", ".tiff": "tiff", ".bmp": "bmp"}
+
+
+@dataclass
+class ToolCapabilities:
+    ffmpeg: Optional[str] = None
+    ffmpeg_version: str = ""
+    ffmpeg_encoders: Tuple[str, ...] = ()
+    exiftool: Optional[str] = None
+    exiftool_version: str = ""
+    jpegtran: Optional[str] = None
+
+    def fingerprint(self) -> str:
+        return "|".join([
+            APP_VERSION, getattr(Image, "__version__", ""),
+            str(self.ffmpeg), self.ffmpeg_version, ",".join(self.ffmpeg_encoders),
+            str(self.exiftool), self.exiftool_version, str(self.jpegtran),
+        ])
+
+
+def _tool_stamp(path: Optional[str]) -> Optional[List]:
+	if not path:
+		return None
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return [path, st.st_mtime_ns, st.st_size]
+
+
+def _run_probe(cmd: List[str]) -> str:
+	import subprocess
+	try:
+		res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=15)
+	except Exception:
+		return ""
+	return res.stdout if res.returncode == 0 else ""
+
+
+@functools.lru_cache(maxsize=None)
+def probe_capabilities() -> ToolCapabilities:
+	"""Locate external tools and query their versions/encoders once per process.
+
+	Probe results are cached on disk keyed by the tools' path, mtime and size, so
+	freshly spawned worker processes only pay for a few ``stat`` calls.
+	"""
+	paths = {name: shutil.which(name) for name in ("ffmpeg", "exiftool", "jpegtran")}
+	stamps = {name: _tool_stamp(path) for name, path in paths.items()}
+	cache_path = _app_cache_dir() / "capabilities.json"
+	try:
+		cached = json.loads(cache_path.read_text(encoding="utf-8"))
+		if cached.get("stamps") == stamps:
+			caps = cached["capabilities"]
+			caps["ffmpeg_encoders"] = tuple(caps.get("ffmpeg_encoders", ()))
+			return ToolCapabilities(**caps)
+	except Exception:
+		pass
+
+	caps = ToolCapabilities(ffmpeg=paths["ffmpeg"], exiftool=paths["exiftool"], jpegtran=paths["jpegtran"])
+	if caps.ffmpeg:
+		first_line = _run_probe([caps.ffmpeg, "-hide_banner", "-version"]).splitlines()[:1]
+		caps.ffmpeg_version = first_line[0] if first_line else ""
+		wanted = set(FFMPEG_ENCODERS.values())
+		encoders = []
+		for line in _run_probe([caps.ffmpeg, "-hide_banner", "-encoders"]).splitlines():
+			parts = line.split()
+			# 形如 " V....D mjpeg    MJPEG (Motion JPEG)"
+			if len(parts) >= 2 and parts[1] in wanted:
+				encoders.append(parts[1])
+		caps.ffmpeg_encoders = tuple(sorted(encoders))
+	if caps.exiftool:
+		caps.exiftool_version = _run_probe([caps.exiftool, "-ver"]).strip()
+
+	try:
+		cache_path.parent.mkdir(parents=True, exist_ok=True)
+		payload = dict(caps.__dict__)
+		payload["ffmpeg_encoders"] = list(caps.ffmpeg_encoders)
+		_write_atomic(cache_path, json.dumps({"stamps": stamps, "capabilities": payload}))
+	except OSError:
+		pass
+	return caps
+
+
+def _engine_available(engine: str, input_ext: str, output_format: str, caps: ToolCapabilities) -> bool:
+	if engine == "ffmpeg":
+		if not caps.ffmpeg:
+			return False
+		target = {"JPG": ".jpg", "PNG": ".png"}.get(output_format, input_ext)
+		if output_format == "原格式" and target in (".jpg", ".jpeg"):
+			return True  # -c:v copy
+		encoder = FFMPEG_ENCODERS.get(target)
+		return encoder is None or encoder in caps.ffmpeg_encoders
+	if engine == "exiftool":
+		return bool(caps.exiftool) and output_format == "原格式"
+	return engine == "pillow"
+
+
+def _engine_is_lossless(engine: str, input_ext: str, output_format: str) -> bool:
+	"""Whether *engine* keeps pixel data intact (format conversion is lossy for everyone)."""
+	if output_format != "原格式":
+		return False
+	if engine == "exiftool":
+		return True
+	if input_ext in (".png", ".tif", ".tiff", ".bmp"):
+		return True
+	# JPEG: FFmpeg 流复制无损，Pillow 重编码有损；WebP: 两者都会重编码
+	return engine == "ffmpeg" and input_ext in (".jpg", ".jpeg")
+
+
+def _calibration_key(input_ext: str, output_format: str) -> str:
+	if input_ext == ".jpeg":
+		input_ext = ".jpg"
+	elif input_ext == ".tiff":
+		input_ext = ".tif"
+	if output_format != "原格式":
+		return f"*|{output_format}"  # 转换耗时主要取决于目标编码器
+	return f"{input_ext}|{output_format}"
+
+
+@functools.lru_cache(maxsize=None)
+def _load_calibration() -> dict:
+	"""Engine timings measured on this machine, or {} if not calibrated for the current tools."""
+	try:
+		data = json.loads((_app_cache_dir() / "engine_calibration.json").read_text(encoding="utf-8"))
+	except Exception:
+		return {}
+	if data.get("fingerprint") != probe_capabilities().fingerprint():
+		return {}
+	return data.get("timings", {})
+
+
+def _engine_order(input_ext: str, output_format: str, prefer_ffmpeg: bool, allow_tools: bool = True) -> List[str]:
+	"""Engines to try for one file, best first; Pillow is always kept as a fallback.
+
+	FFmpeg is only used when *prefer_ffmpeg* is set, and then goes ahead of any
+	engine that is equally lossless; calibrated timings order the rest.
+	"""
+	caps = probe_capabilities()
+	candidates = [
+		e for e in DEFAULT_ENGINE_ORDER
+		if (e == "pillow" or allow_tools)
+		and (e != "ffmpeg" or prefer_ffmpeg)
+		and _engine_available(e, input_ext, output_format, caps)
+	]
+	timings = _load_calibration().get(_calibration_key(input_ext, output_format))
+	if timings:
+		# 校准时输出不合格（仍有元数据或无法打开）的引擎记为 None，不再使用
+		candidates = [e for e in candidates if e == "pillow" or timings.get(e, 0.0) is not None]
+		# 小样图上的耗时主要是进程启动开销，只用来给其余引擎排序，不压过用户的 FFmpeg 偏好
+		candidates.sort(key=lambda e: (
+			not _engine_is_lossless(e, input_ext, output_format),
+			e != "ffmpeg",
+			timings.get(e) if timings.get(e) is not None else float("inf"),
+		))
+	return candidates
+
+
+def _engine_ffmpeg(input_path: Path, output_path: Path, output_format: str, timeout: float) -> Tuple[bool, str]:
+	success, msg = _ffmpeg_clean_metadata(input_path, output_path, output_format, timeout)
+	if success and output_path.suffix.lower() == '.png':
+		# 如果输出是 PNG 格式，进行额外的深度清理
+		_clean_png_info_thoroughly(output_path)
+	return success, msg
+
+
+def _engine_exiftool(input_path: Path, output_path: Path, output_format: str, timeout: float) -> Tuple[bool, str]:
+	import subprocess
+	exiftool = _has_exiftool()
+	_ensure_parent_dir(output_path)
+	# exiftool 不会覆盖已存在的 -o 目标，先写临时文件再替换
+	same_file = output_path.resolve() == input_path.resolve()
+	if same_file:
+		cmd = [exiftool, "-all=", "-overwrite_original", str(input_path)]
+		tmp_path = None
+	else:
+		tmp_path = _tool_temp_path(output_path, "exiftool")
+		tmp_path.unlink(missing_ok=True)
+		cmd = [exiftool, "-all=", "-o", str(tmp_path), str(input_path)]
+	try:
+		res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+	except subprocess.TimeoutExpired:
+		if tmp_path:
+			tmp_path.unlink(missing_ok=True)
+		return False, "exiftool处理超时"
+	if res.returncode != 0:
+		if tmp_path:
+			tmp_path.unlink(missing_ok=True)
+		return False, f"exiftool错误: {res.stderr}"
+	if tmp_path:
+		os.replace(tmp_path, output_path)
+	# 如果是 PNG 文件，进行额外的深度清理
+	if output_path.suffix.lower() == '.png':
+		_clean_png_info_thoroughly(output_path)
+	return True, "exiftool清理成功"
+
+
+def _engine_pillow(input_path: Path, output_path: Path, output_format: str, timeout: float) -> Tuple[bool, str]:
+	try:
+		_pil_resave_strip_metadata_with_format(input_path, output_path, output_format)
+	except Exception as e:
+		return False, str(e)
+	_piexif_strip_if_needed(output_path)
+	# 如果输出是 PNG 格式，进行额外的深度清理
+	if output_path.suffix.lower() == '.png':
+		_clean_png_info_thoroughly(output_path)
+	return True, "Python清理成功"
+
+
+CLEAN_ENGINES = {"ffmpeg": _engine_ffmpeg, "exiftool": _engine_exiftool, "pillow": _engine_pillow}
+
+
+# TIFF 的图像结构本身就存放在 IFD0 中，只检查这些描述性标签
+TIFF_METADATA_TAGS = {
+	0x010E, 0x010F, 0x0110, 0x0131, 0x0132, 0x013B,  # 描述、厂商、型号、软件、时间、作者
+	0x02BC, 0x83BB, 0x8298, 0x8769, 0x8825,  # XMP、IPTC、版权、Exif IFD、GPS IFD
+}
+
+
+def _output_is_clean(path: Path) -> bool:
+	"""Check that a cleaned file decodes and carries no EXIF/XMP/text metadata."""
+	try:
+		with Image.open(str(path)) as im:
+			im.load()
+			exif = im.getexif()
+			if im.format == "TIFF":
+				if TIFF_METADATA_TAGS & set(exif):
+					return False
+			elif len(exif):
+				return False
+			if getattr(im, "text", None):
+				return False
+			return not any(k in im.info for k in ("exif", "xmp", "XML:com.adobe.xmp", "comment"))
+	except Exception:
+		return False
+
+
+def _make_calibration_sample(directory: Path, ext: str) -> Optional[Path]:
+	"""Write a tiny image of format *ext* carrying metadata; None if Pillow cannot encode it."""
+	path = directory / f"sample{ext}"
+	im = Image.new("RGB", (64, 64), (120, 80, 40))
+	exif = Image.Exif()
+	exif[0x0131] = "ClearMeta calibration"  # Software
+	try:
+		if ext == ".png":
+			info = PngImagePlugin.PngInfo()
+			info.add_text("parameters", "calibration")
+			im.save(str(path), "PNG", pnginfo=info)
+		elif ext == ".bmp":
+			im.save(str(path), "BMP")
+		else:
+			fmt = {".jpg": "JPEG", ".webp": "WEBP", ".tif": "TIFF"}[ext]
+			im.save(str(path), fmt, exif=exif.tobytes())
+	except Exception:
+		return None
+	return path
+
+
+def calibrate_engines(force: bool = False, log: Callable[[str], None] = lambda _msg: None) -> dict:
+	"""Time every available engine per format on a tiny sample and cache the result on disk.
+
+	Returns the timings dict used by _engine_order; a no-op if a calibration for the
+	current tool versions already exists unless *force* is set.
+	"""
+	if not force:
+		timings = _load_calibration()
+		if timings:
+			return timings
+
+	caps = probe_capabilities()
+	jobs = [(ext, "原格式") for ext in CALIBRATION_EXTS] + [(".png", "JPG"), (".jpg", "PNG")]
+	timings = {}
+	with tempfile.TemporaryDirectory(prefix="clearmeta-calibrate-") as tmp:
+		tmp_dir = Path(tmp)
+		for ext, output_format in jobs:
+			sample = _make_calibration_sample(tmp_dir, ext)
+			if sample is None:
+				continue
+			key = _calibration_key(ext, output_format)
+			timings[key] = {}
+			for engine in DEFAULT_ENGINE_ORDER:
+				if not _engine_available(engine, ext, output_format, caps):
+					continue
+				target = {"JPG": ".jpg", "PNG": ".png"}.get(output_format, ext)
+				best = None
+				for round_no in range(CALIBRATION_ROUNDS):
+					out = tmp_dir / f"out-{engine}-{round_no}{target}"
+					start = time.perf_counter()
+					ok, _ = CLEAN_ENGINES[engine](sample, out, output_format, 30.0)
+					elapsed = time.perf_counter() - start
+					if not ok or not _output_is_clean(out):
+						best = None
+						break
+					best = elapsed if best is None else min(best, elapsed)
+				timings[key][engine] = best
+				log(f"校准 {key} {engine}: " + (f"{best * 1000:.1f}ms" if best is not None else "不可用"))
+
+	try:
+		cache_path = _app_cache_dir() / "engine_calibration.json"
+		cache_path.parent.mkdir(parents=True, exist_ok=True)
+		_write_atomic(cache_path, json.dumps({"fingerprint": caps.fingerprint(), "timings": timings}))
+	except OSError:
+		pass
+	_load_calibration.cache_clear()
+	return timings
+
+
+# --------------------------- 免处理直通 ---------------------------
+#
+# 只扫描文件头/块结构判断是否含有需要清理的元数据；没有的话直接复制（优先使用
+# reflink / copy_file_range 等内核侧复制），覆盖模式下则完全不动原文件。
+
+_IMAGE_MAGIC = [
+	(b"\xff\xd8\xff", ".jpg"),
+	(b"\x89PNG\r\n\x1a\n", ".png"),
+	(b"II*\x00", ".tif"),
+	(b"MM\x00*", ".tif"),
+	(b"BM", ".bmp"),
+]
+
+# 不携带元数据的 PNG 块，其余块（tEXt/zTXt/iTXt/eXIf/tIME/iCCP/私有块…）都需要清理
+PNG_STRUCTURAL_CHUNKS = {b"IHDR", b"PLTE", b"IDAT", b"IEND", b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"sBIT", b"bKGD", b"pHYs", b"hIST"}
+# 不携带元数据的 WebP 块（EXIF/XMP /ICCP 需要清理）
+WEBP_STRUCTURAL_CHUNKS = {b"VP8 ", b"VP8L", b"VP8X", b"ALPH", b"ANIM", b"ANMF"}
+
+FICLONE = 0x40049409  # Linux ioctl：在支持的文件系统（btrfs/XFS…）上创建 reflink
+
+
+def _sniff_image_ext(data: bytes) -> Optional[str]:
+	"""Guess the image extension from magic bytes; None if unsupported."""
+	if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+		return ".webp"
+	for magic, ext in _IMAGE_MAGIC:
+		if data.startswith(magic):
+			return ext
+	return None
+
+
+def _jpeg_has_metadata(head: bytes) -> bool:
+	for marker, payload in _iter_jpeg_segments(head):
+		if marker == 0xDA:
+			return False
+		if marker == 0xFE:  # COM
+			return True
+		if 0xE0 <= marker <= 0xEF:
+			if marker == 0xE0 and payload.startswith(b"JFIF\x00"):
+				continue
+			if marker == 0xEE and payload.startswith(b"Adobe"):
+				continue  # 颜色变换标记，解码需要
+			return True
+	# 没扫描到 SOS（文件头过大或结构异常），保守处理
+	return True
+
+
+# 熵编码数据中的标记：0xFF 后跟的不是填充 0x00、RSTn 或另一个 0xFF
+_JPEG_ENTROPY_MARKER = re.compile(rb"\xff[^\x00\xd0-\xd7\xff]")
+
+
+def _jpeg_image_end(data) -> Optional[int]:
+	"""Offset just past the first image's EOI marker, or None if the stream is malformed."""
+	pos = 2
+	while pos + 2 <= len(data):
+		if data[pos] != 0xFF:
+			return None
+		marker = data[pos + 1]
+		if marker == 0xFF:  # 填充字节
+			pos += 1
+			continue
+		if marker == 0xD9:
+			return pos + 2
+		if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+			pos += 2
+			continue
+		pos += 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+		if marker == 0xDA:
+			# 跳过熵编码数据，直接定位下一个标记（渐进式 JPEG 有多个扫描段）
+			found = _JPEG_ENTROPY_MARKER.search(data, pos)
+			if found is None:
+				return None
+			pos = found.start()
+	return None
+
+
+def _jpeg_has_trailing_data(fh, size: int) -> bool:
+	"""Whether anything (or nothing parseable) follows the first image's EOI."""
+	with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		return _jpeg_image_end(data) != size
+
+
+def _png_has_metadata(fh, size: int) -> bool:
+	fh.seek(8)
+	while True:
+		header = fh.read(8)
+		if len(header) < 8:
+			return True  # 截断的文件交给引擎处理
+		length = int.from_bytes(header[:4], "big")
+		chunk_type = header[4:8]
+		if chunk_type == b"IEND":
+			# IEND 之后追加的数据同样会被原样复制，必须恰好在文件末尾结束
+			return fh.tell() + length + 4 != size
+		if chunk_type not in PNG_STRUCTURAL_CHUNKS:
+			return True
+		fh.seek(length + 4, os.SEEK_CUR)  # 跳过数据和 CRC，不读取像素
+
+
+def _webp_has_metadata(fh, size: int) -> bool:
+	fh.seek(4)
+	riff_end = 8 + int.from_bytes(fh.read(4), "little")  # RIFF 大小不含前 8 字节
+	if riff_end != size:
+		return True  # 截断，或 RIFF 结尾之后还有追加数据，交给引擎处理
+	fh.seek(12)
+	while fh.tell() + 8 <= riff_end:
+		header = fh.read(8)
+		if len(header) < 8:
+			return True
+		chunk_type = header[:4]
+		if chunk_type not in WEBP_STRUCTURAL_CHUNKS:
+			return True
+		length = int.from_bytes(header[4:8], "little")
+		fh.seek(length + (length & 1), os.SEEK_CUR)
+	# chunk 恰好在 RIFF 头声明的结尾处结束才视为完整；越界的长度字段交给引擎处理
+	return fh.tell() != riff_end
+
+
+def _needs_cleaning(file_path: Path) -> bool:
+	"""Return False only when a scan proves there is no metadata to strip.
+
+	The scan must also reach the real end of the file: bytes appended after the
+	image would otherwise be copied through untouched.
+	"""
+	try:
+		with open(file_path, "rb") as fh:
+			head = fh.read(JPEG_HEADER_SCAN_BYTES)
+			size = os.fstat(fh.fileno()).st_size
+			kind = _sniff_image_ext(head)
+			if kind != {".jpeg": ".jpg", ".tiff": ".tif"}.get(file_path.suffix.lower(), file_path.suffix.lower()):
+				return True  # 扩展名与内容不符，交给引擎重新生成
+			if kind == ".bmp":
+				# BMP 没有元数据容器，但文件头中的 bfSize 必须与实际大小一致
+				return int.from_bytes(head[2:6], "little") != size
+			if kind == ".jpg":
+				return _jpeg_has_metadata(head) or _jpeg_has_trailing_data(fh, size)
+			if kind == ".png":
+				return _png_has_metadata(fh, size)
+			if kind == ".webp":
+				return _webp_has_metadata(fh, size)
+	except OSError:
+		pass
+	# TIFF 的元数据与图像结构混在同一个 IFD 中，总是交给引擎处理
+	return True
+
+
+def _fast_copy(src: Path, dst: Path) -> str:
+	"""Copy *src* to *dst* without pulling data through user space where possible.
+
+	Tries a reflink, then ``copy_file_range``, then ``sendfile``, and finally
+	``shutil.copyfile``. Returns the name of the method that worked.
+	"""
+	_ensure_parent_dir(dst)
+	tmp = dst.with_name(f".{dst.name}.copy.tmp")
+	method = "copyfile"
+	try:
+		with open(src, "rb") as fin, open(tmp, "wb") as fout:
+			size = os.fstat(fin.fileno()).st_size
+			try:
+				import fcntl
+				fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+				method = "reflink"
+			except (ImportError, OSError):
+				for name in ("copy_file_range", "sendfile"):
+					func = getattr(os, name, None)
+					if func is None:
+						continue
+					copied = 0
+					fout.seek(0)
+					try:
+						while copied < size:
+							if name == "copy_file_range":
+								n = func(fin.fileno(), fout.fileno(), size - copied, copied, copied)
+							else:
+								n = func(fout.fileno(), fin.fileno(), copied, size - copied)
+							if n == 0:
+								break
+							copied += n
+					except OSError:
+						continue
+					if copied == size:
+						method = name
+						break
+				if method == "copyfile":
+					fout.seek(0)
+					fout.truncate()
+					fin.seek(0)
+					shutil.copyfileobj(fin, fout, 1024 * 1024)
+		os.replace(tmp, dst)
+	except BaseException:
+		tmp.unlink(missing_ok=True)
+		raise
+	return method
+
+
+def _passthrough_if_clean(input_path: Path, output_path: Path, output_format: str) -> Optional[str]:
+	"""Produce *output_path* without re-encoding if the input has nothing to strip.
+
+	Returns a status message, or None if the file needs a real engine.
+	"""
+	ext = input_path.suffix.lower()
+	same_kind = (
+		output_format == "原格式"
+		or (output_format == "JPG" and ext in (".jpg", ".jpeg"))
+		or (output_format == "PNG" and ext == ".png")
+	)
+	if not same_kind or _needs_cleaning(input_path):
+		return None
+	try:
+		same_file = output_path.resolve() == input_path.resolve()
+	except OSError:
+		same_file = False
+	if same_file:
+		return f"无需清理: {input_path.name}（原文件未改动）"
+	method = _fast_copy(input_path, output_path)
+	return f"无需清理: {input_path.name}（{method} 复制）"
+
+
+# --------------------------- 输入防护 ---------------------------
+
+# 超过该像素数的图片不解码，直接隔离；与 Pillow 自身拒绝打开的阈值（默认上限的 2 倍）一致，
+# 不修改 Pillow 的全局设置
+MAX_IMAGE_PIXELS = 2 * Image.MAX_IMAGE_PIXELS
+# 解码后的原始像素字节数 / 文件大小 超过该比例且图片较大时，视为疑似解压炸弹
+MAX_DECOMPRESSION_RATIO = 1000
+DECOMPRESSION_CHECK_MIN_PIXELS = 64_000_000
+
+# 单个任务的截止时间随输入大小增长
+TASK_DEADLINE_BASE = 20.0  # 秒
+TASK_DEADLINE_PER_MB = 4.0  # 秒
+TASK_DEADLINE_MAX = 600.0  # 秒
+# 外部工具的总超时只占任务截止时间的一部分：工具先超时并被回收，看门狗只兜底
+TOOL_TIMEOUT_FRACTION = 0.8
+
+
+def _task_deadline(file_path: Path) -> float:
+	"""Seconds a single image may take before it is considered stuck."""
+	try:
+		size_mb = file_path.stat().st_size / (1024 * 1024)
+	except OSError:
+		size_mb = 0.0
+	return min(TASK_DEADLINE_BASE + TASK_DEADLINE_PER_MB * size_mb, TASK_DEADLINE_MAX)
+
+
+def _precheck_image(file_path: Path) -> Optional[str]:
+	"""Inspect only the image header; return a quarantine reason, or None if safe to process.
+
+	Files Pillow cannot identify are not quarantined here; FFmpeg/exiftool may still handle them.
+	"""
+	try:
+		size = file_path.stat().st_size
+	except OSError as e:
+		return f"无法读取文件: {e}"
+	if size == 0:
+		return "空文件"
+	try:
+		with Image.open(str(file_path)) as img:
+			width, height = img.size
+			bands = len(img.getbands())
+	except Image.DecompressionBombError:
+		return f"像素数超限 (上限 {MAX_IMAGE_PIXELS} 像素)"
+	except Exception:
+		return None
+
+	pixels = width * height
+	if pixels > MAX_IMAGE_PIXELS:
+		return f"像素数超限: {width}x{height}"
+	if pixels >= DECOMPRESSION_CHECK_MIN_PIXELS and pixels * bands / size > MAX_DECOMPRESSION_RATIO:
+		return f"疑似解压炸弹: {width}x{height}，文件仅 {size} 字节"
+	return None
+
+
 def clean_one_image(
 	input_path: Path,
 	output_path: Path,
 	prefer_ffmpeg: bool = True,
 	output_format: str = "原格式",
+	timeout: Optional[float] = None,
 ) -> Tuple[bool, str]:
 	"""Clean metadata from a single image file with enhanced AI metadata removal using FFmpeg.
 
+	*timeout* is the total budget for external tool calls; by default it is a fraction
+	of the task deadline, so tools time out before a watchdog would kill the caller.
 	Returns (ok, message).
 	"""
+	if timeout is None:
+		timeout = _task_deadline(input_path) * TOOL_TIMEOUT_FRACTION
+	budget_end = time.monotonic() + timeout
 	try:
-		# 先检测是否为AI生成图片
-		is_ai, ai_markers = detect_ai_generated_metadata(input_path)
-		ai_info = f" (检测到AI生成: {len(ai_markers)}个标识)" if is_ai else ""
-		
 		# 根据输出格式调整输出路径
-		if output_format == "JPG":
-			output_path = output_path.with_suffix('.jpg')
-		elif output_format == "PNG":
-			output_path = output_path.with_suffix('.png')
+		output_path = _output_path_with_format(output_path, output_format)
 		
-		# 方法1: 优先使用 FFmpeg (最强大的元数据清理，支持格式转换)
-		if prefer_ffmpeg and _has_ffmpeg():
-			success, msg = _ffmpeg_clean_metadata(input_path, output_path, output_format)
-			if success:
-				# 如果输出是 PNG 格式，进行额外的深度清理
-				if output_path.suffix.lower() == '.png':
-					_clean_png_info_thoroughly(output_path)
-				return True, f"FFmpeg清理: {input_path.name}{ai_info}"
-			# FFmpeg 失败则继续尝试其他方法
-		
-		# 方法2: 使用 exiftool 作为备选 (不支持格式转换)
-		if _has_exiftool() and output_format == "原格式":
-			_ensure_parent_dir(output_path)
-			import subprocess
-
-			cmd = [_has_exiftool(), "-all=", "-o", str(output_path), str(input_path)]
-			res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-			if res.returncode == 0:
-				# 如果是 PNG 文件，进行额外的深度清理
-				if output_path.suffix.lower() == '.png':
-					_clean_png_info_thoroughly(output_path)
-				return True, f"exiftool清理: {input_path.name}{ai_info}"
+		# 文件头中没有任何元数据：直接复制或保持原样，不解码也不做 AI 检测
+		passthrough = _passthrough_if_clean(input_path, output_path, output_format)
+		if passthrough:
+			return True, passthrough
 		
-		# 方法3: 使用 Python/Pillow (支持格式转换)
-		_pil_resave_strip_metadata_with_format(input_path, output_path, output_format)
-		_piexif_strip_if_needed(output_path)
+		# 先检测是否为AI生成图片
+		is_ai, ai_markers = detect_ai_generated_metadata(input_path)
+		ai_info = f" (检测到AI生成: {len(ai_markers)}个标识)" if is_ai else ""
 		
-		# 如果输出是 PNG 格式，进行额外的深度清理
-		if output_path.suffix.lower() == '.png':
-			_clean_png_info_thoroughly(output_path)
+		# 带 Orientation 的 JPEG：FFmpeg/exiftool 去掉 EXIF 后画面会“转回去”，
+		# 输出 JPEG 时优先用 jpegtran 在 DCT 域无损旋转；其余情况（包括转 PNG）
+		# 只能交给 Pillow 解码后按方向旋转再编码
+		tools_allowed = True
+		if input_path.suffix.lower() in {".jpg", ".jpeg"}:
+			orientation = _jpeg_orientation(input_path)
+			if orientation != 1:
+				if output_format in ("原格式", "JPG"):
+					success, msg = _jpegtran_normalize(input_path, output_path, orientation, timeout)
+					if success:
+						return True, f"jpegtran无损清理: {input_path.name}{ai_info}"
+				tools_allowed = False
 		
+		# 按本机校准结果依次尝试 FFmpeg / exiftool / Pillow，失败则回退到下一个
 		format_info = f" -> {output_format}" if output_format != "原格式" else ""
-		return True, f"Python清理: {input_path.name}{ai_info}{format_info}"
+		msg = "没有可用的清理引擎"
+		for engine in _engine_order(input_path.suffix.lower(), output_format, prefer_ffmpeg, tools_allowed):
+			remaining = budget_end - time.monotonic()
+			if remaining <= 0:
+				msg = "处理超时"
+				break
+			success, msg = CLEAN_ENGINES[engine](input_path, output_path, output_format, remaining)
+			if success:
+				return True, f"{ENGINE_LABELS[engine]}: {input_path.name}{ai_info}{format_info}"
+		return False, f"清理失败: {input_path.name} -> {msg}"
 
 	except Exception as e:
 		return False, f"清理失败: {input_path.name} -> {e}"
@@ -445,7 +1424,7 @@ def gather_images(paths: List[Path]) -> List[Path]:
 			for root, _, fnames in os.walk(p):
 				for fn in fnames:
 					ext = Path(fn).suffix.lower()
-					if ext in SUPPORTED_EXTS:
+					if ext in SUPPORTED_EXTS and not _TOOL_TEMP_NAME.match(fn):
 						files.append(Path(root) / fn)
 		else:
 			if p.suffix.lower() in SUPPORTED_EXTS:
@@ -460,60 +1439,995 @@ def gather_images(paths: List[Path]) -> List[Path]:
 	return out
 
 
-# --------------------------- GUI ---------------------------
+@dataclass
+class JobConfig:
+    overwrite: bool
+    output_dir: Optional[Path]
+    use_ffmpeg: bool
+    output_format: str = "原格式"  # "原格式", "JPG", "PNG"
+    workers: int = 4
+    # 非空时在输出目录下镜像相对这些输入根目录的子路径，避免不同文件夹中的同名文件互相覆盖
+    input_roots: Tuple[Path, ...] = ()
+
+
+def _input_roots(paths: List[Path]) -> List[Path]:
+	"""Resolved root directories for *paths*: folders themselves, parents for single files."""
+	roots: List[Path] = []
+	for p in paths:
+		root = p.resolve() if p.is_dir() else p.resolve().parent
+		if root not in roots:
+			roots.append(root)
+	return roots
+
+
+def _output_path_for(f: Path, config: JobConfig) -> Path:
+	"""Return the output path for *f* under the given job configuration."""
+	if config.overwrite:
+		return f
+	out_base = config.output_dir or f.parent
+	if config.output_dir and config.input_roots:
+		for root in config.input_roots:
+			try:
+				rel = f.relative_to(root)
+			except ValueError:
+				continue
+			# 多个输入根目录时再加一层根目录名区分
+			return out_base / rel if len(config.input_roots) == 1 else out_base / root.name / rel
+	return out_base / f.name
+
+
+@dataclass
+class CleanResult:
+    index: int
+    path: Path
+    ok: bool
+    message: str
+    quarantine_reason: Optional[str] = None  # 非空表示文件被隔离
+
+
+def _clean_task(
+	input_path: Path,
+	output_path: Path,
+	prefer_ffmpeg: bool,
+	output_format: str,
+	timeout: Optional[float] = None,
+) -> Tuple[bool, str, Optional[str]]:
+	"""Worker-process entry: pre-check, then clean. Returns (ok, msg, quarantine_reason)."""
+	reason = _precheck_image(input_path)
+	if reason:
+		return False, f"已隔离: {input_path.name} -> {reason}", reason
+	ok, msg = clean_one_image(input_path, output_path, prefer_ffmpeg, output_format, timeout)
+	return ok, msg, None
+
+
+def _detect_task(input_path: Path) -> Tuple[bool, List[str]]:
+	"""Worker-process entry for AI detection. Returns (is_ai, sorted markers)."""
+	is_ai, markers = detect_ai_generated_metadata(input_path)
+	return is_ai, sorted(markers)
+
+
+FFMPEG_BATCH_SIZE = 16
+FFMPEG_BATCH_MAX_BYTES = 2 * 1024 * 1024  # 只有小文件的进程启动开销才值得合并
+# 合并调用只处理小文件，超时按文件数给一个较短的预算，卡住时尽快退回逐个处理
+FFMPEG_BATCH_TIMEOUT_BASE = 5.0  # 秒
+FFMPEG_BATCH_TIMEOUT_PER_FILE = 1.0  # 秒
+
+
+def _ffmpeg_batch_timeout(count: int) -> float:
+	"""Timeout for one multi-output FFmpeg invocation over *count* small files."""
+	return FFMPEG_BATCH_TIMEOUT_BASE + FFMPEG_BATCH_TIMEOUT_PER_FILE * count
+
+
+def _clean_batch_task(items: List[Tuple[Path, Path]], prefer_ffmpeg: bool, output_format: str) -> List[Optional[Tuple[bool, str, Optional[str]]]]:
+	"""Worker-process entry for a chunk of small files sharing one FFmpeg invocation.
+
+	Returns one entry per item: a (ok, msg, quarantine_reason) tuple, or None for files
+	that need the single-file path (orientation fix, batch failure, unexpected error);
+	the caller retries those individually under their own deadline.
+	"""
+	results: List[Optional[Tuple[bool, str, Optional[str]]]] = [None] * len(items)
+	batch = []  # (idx, input, adjusted output, ai_info)
+	format_info = f" -> {output_format}" if output_format != "原格式" else ""
+	for idx, (input_path, output_path) in enumerate(items):
+		try:
+			reason = _precheck_image(input_path)
+			if reason:
+				results[idx] = (False, f"已隔离: {input_path.name} -> {reason}", reason)
+				continue
+			target = _output_path_with_format(output_path, output_format)
+			passthrough = _passthrough_if_clean(input_path, target, output_format)
+			if passthrough:
+				results[idx] = (True, passthrough, None)
+				continue
+			if input_path.suffix.lower() in {".jpg", ".jpeg"} and _jpeg_orientation(input_path) != 1:
+				continue
+			# 覆盖模式下输出会替换输入，AI 检测必须在清理之前完成
+			is_ai, ai_markers = detect_ai_generated_metadata(input_path)
+			ai_info = f" (检测到AI生成: {len(ai_markers)}个标识)" if is_ai else ""
+			batch.append((idx, input_path, target, ai_info))
+		except Exception:
+			continue  # 单个文件的异常不影响整块，交给调用方单独重试
+
+	if batch:
+		outcomes = _ffmpeg_clean_batch([(inp, out) for _, inp, out, _ in batch], output_format,
+		                               _ffmpeg_batch_timeout(len(batch)))
+		for (idx, input_path, _, ai_info), (ok, _) in zip(batch, outcomes):
+			if ok:
+				results[idx] = (True, f"FFmpeg批量清理: {input_path.name}{ai_info}{format_info}", None)
+	return results
+
+
+def _ffmpeg_batchable(file_path: Path, config: JobConfig) -> bool:
+	"""Whether *file_path* is small and FFmpeg is enabled and calibrated as correct for its format."""
+	if not config.use_ffmpeg:
+		return False
+	try:
+		if file_path.stat().st_size > FFMPEG_BATCH_MAX_BYTES:
+			return False
+	except OSError:
+		return False
+	input_ext = file_path.suffix.lower()
+	if not _engine_available("ffmpeg", input_ext, config.output_format, probe_capabilities()):
+		return False
+	# 校准时输出不合格（记为 None）或没有校准结果的格式不合并
+	timings = _load_calibration().get(_calibration_key(input_ext, config.output_format)) or {}
+	return timings.get("ffmpeg") is not None
+
+
+def _guarded_worker_main(conn) -> None:
+	"""Loop in a child process: receive (func, args), send back the result."""
+	if hasattr(os, "setsid"):
+		# 独立进程组：看门狗可以连同 FFmpeg/exiftool/jpegtran 子进程一起终止
+		os.setsid()
+	while True:
+		try:
+			task = conn.recv()
+		except EOFError:
+			return
+		if task is None:
+			return
+		func, args = task
+		try:
+			result = func(*args)
+		except Exception as e:
+			result = (False, f"清理失败: {e}", None)
+		conn.send(result)
+
+
+class GuardedPool:
+    """Process pool with per-task deadlines.
+
+    Threads cannot be interrupted, so a file that hangs Pillow or a codec would hold a
+    thread forever; here the supervisor kills the overrunning worker process, reports the
+    task as timed out and starts a replacement, so the rest of the batch keeps moving.
+    """
+
+    def __init__(self, workers: int):
+        # spawn：避免在带有 Qt/后台线程的进程里 fork
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = [self._spawn() for _ in range(max(1, workers))]
+
+    def _spawn(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_guarded_worker_main, args=(child_conn,), daemon=True)
+        proc.start()
+        child_conn.close()
+        return proc, parent_conn
+
+    @staticmethod
+    def _kill(proc) -> None:
+        """Kill a worker and, on POSIX, every tool process in its process group."""
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+                return
+            except OSError:
+                pass  # 进程尚未调用 setsid，或进程组已不存在
+        if proc.is_alive():
+            proc.kill()
+
+    def _replace(self, worker):
+        proc, conn = worker
+        # 即使工作进程已崩溃，它启动的外部工具也可能仍在其进程组中运行
+        self._kill(proc)
+        proc.join(timeout=5)
+        conn.close()
+        self._workers.remove(worker)
+        fresh = self._spawn()
+        self._workers.append(fresh)
+        return fresh
+
+    def run(self, tasks: List[Tuple[object, Callable, tuple, float]]) -> Iterator[Tuple[object, object, Optional[str]]]:
+        """Run (key, func, args, deadline_seconds) tasks.
+
+        Yields (key, result, None) on completion, or (key, None, reason) when the worker
+        overran its deadline or died.
+        """
+        pending = list(reversed(tasks))
+        idle = list(self._workers)
+        busy = {}  # conn -> (worker, key, started, deadline)
+
+        while pending or busy:
+            while idle and pending:
+                worker = idle.pop()
+                key, func, args, deadline = pending.pop()
+                worker[1].send((func, args))
+                busy[worker[1]] = (worker, key, time.monotonic(), deadline)
+
+            now = time.monotonic()
+            wait_for = min(started + deadline - now for _, _, started, deadline in busy.values())
+            waitables = list(busy) + [w[0].sentinel for w, _, _, _ in busy.values()]
+            ready = mp_connection.wait(waitables, timeout=max(0.0, wait_for))
+
+            for conn in list(busy):
+                worker, key, started, deadline = busy[conn]
+                proc = worker[0]
+                if conn in ready:
+                    try:
+                        result = conn.recv()
+                    except (EOFError, OSError):
+                        del busy[conn]
+                        idle.append(self._replace(worker))
+                        yield key, None, f"工作进程异常退出 (exitcode={proc.exitcode})"
+                        continue
+                    del busy[conn]
+                    idle.append(worker)
+                    yield key, result, None
+                elif proc.sentinel in ready:
+                    del busy[conn]
+                    idle.append(self._replace(worker))
+                    yield key, None, f"工作进程异常退出 (exitcode={proc.exitcode})"
+                elif time.monotonic() - started > deadline:
+                    # 看门狗：超时的任务连同进程一起终止，换一个新进程继续
+                    del busy[conn]
+                    idle.append(self._replace(worker))
+                    yield key, None, f"处理超时 (>{deadline:.0f}s)"
+
+    def close(self) -> None:
+        for proc, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for proc, conn in self._workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                self._kill(proc)
+            conn.close()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_clean_results(files: List[Path], config: JobConfig) -> Iterator[CleanResult]:
+	"""Clean *files* with a local guarded worker pool, yielding a CleanResult as each completes.
+
+	Files that fail the header pre-check, overrun their deadline or crash a worker are
+	reported with ``quarantine_reason`` set instead of stalling the batch.
+	"""
+	# 在父进程中完成一次性校准并写入磁盘，工作进程直接读取
+	calibrate_engines()
+
+	def single_task(i: int):
+		f = files[i]
+		return i, _clean_task, (f, _output_path_for(f, config), config.use_ffmpeg, config.output_format), _task_deadline(f)
+
+	# 启用 FFmpeg 且校准结果合格的小文件按块合并成一次 FFmpeg 调用，摊薄进程启动和编解码器初始化开销
+	batchable = [i for i, f in enumerate(files) if _ffmpeg_batchable(f, config)]
+	batched = set(batchable)
+	tasks = [single_task(i) for i in range(len(files)) if i not in batched]
+	for start in range(0, len(batchable), FFMPEG_BATCH_SIZE):
+		chunk = tuple(batchable[start:start + FFMPEG_BATCH_SIZE])
+		items = [(files[i], _output_path_for(files[i], config)) for i in chunk]
+		# 只比块内 FFmpeg 超时多出预检、AI 检测的余量；失败的文件回到父进程按各自的截止时间重试
+		deadline = _ffmpeg_batch_timeout(len(chunk)) / TOOL_TIMEOUT_FRACTION
+		tasks.append((chunk, _clean_batch_task, (items, config.use_ffmpeg, config.output_format), deadline))
+
+	def to_result(i: int, result, reason: Optional[str]) -> CleanResult:
+		f = files[i]
+		if result is None:
+			return CleanResult(i, f, False, f"已隔离: {f.name} -> {reason}", reason)
+		ok, msg, reason = result
+		return CleanResult(i, f, ok, msg, reason)
+
+	def remove_temps(key) -> None:
+		# 被终止的工作进程来不及清理自己的临时文件（覆盖模式下就在用户的源目录里）
+		for i in (key if isinstance(key, tuple) else (key,)):
+			output_path = _output_path_for(files[i], config)
+			_remove_tool_temps(_output_path_with_format(output_path, config.output_format))
+
+	with GuardedPool(min(config.workers, len(tasks)) or 1) as pool:
+		retry = []
+		for key, result, reason in pool.run(tasks):
+			if result is None:
+				remove_temps(key)
+			if isinstance(key, tuple):
+				if not isinstance(result, list) or len(result) != len(key):
+					# 整块超时、进程崩溃或任务本身抛出异常：逐个单独重试，找出真正有问题的文件
+					retry.extend(key)
+					continue
+				for i, item_result in zip(key, result):
+					if item_result is None:
+						retry.append(i)
+					else:
+						yield to_result(i, item_result, None)
+			else:
+				yield to_result(key, result, reason)
+		if retry:
+			for key, result, reason in pool.run([single_task(i) for i in retry]):
+				if result is None:
+					remove_temps(key)
+				yield to_result(key, result, reason)
+
+
+# --------------------------- 分布式分片 ---------------------------
+#
+# 多台主机通过共享文件系统协作处理同一批图片，协调目录结构：
+#
+#   <coord>/plan.json                 分片计划（最后写入，出现即表示计划就绪）
+#   <coord>/shards/<id>.txt           分片清单，每行一个图片路径
+#   <coord>/leases/<id>.<gen>.lease   租约文件，gen 最大者为当前租约
+#   <coord>/done/<id>.done            分片完成标记
+#   <coord>/quarantine/<node>.tsv     被隔离的文件及原因
+#
+# 领取分片 = 以 O_EXCL 创建下一代租约文件，只有一个节点能成功；
+# 租约持有者定期刷新 mtime 作为心跳，超过 TTL 未刷新即视为节点失联，
+# 其他节点可以创建更高一代的租约接管该分片。
+# 注意：过期判断依赖各主机与文件服务器的时钟大致同步，TTL 应远大于时钟偏差。
+
+SHARD_SIZE = 500
+SHARD_LEASE_TTL = 300.0  # 秒
+SHARD_POLL_INTERVAL = 10.0  # 秒
+
+
+def partition_shards(files: List[Path], shard_size: int = SHARD_SIZE) -> List[List[Path]]:
+	"""Split *files* into consecutive shards of at most *shard_size* entries."""
+	if shard_size <= 0:
+		raise ValueError("shard_size must be positive")
+	return [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+
+
+def _write_atomic(path: Path, text: str) -> None:
+	"""Write *text* to *path* via a temp file + rename so readers never see partial content."""
+	tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+	tmp.write_text(text, encoding="utf-8")
+	os.replace(tmp, path)
+
+
+def prepare_shards(paths: List[Path], coord_dir: Path, shard_size: int = SHARD_SIZE) -> int:
+	"""Discover images under *paths* and write shard manifests into *coord_dir*.
+
+	Only one node should plan; if a plan already exists it is reused.
+	Returns the number of shards.
+	"""
+	plan_path = coord_dir / "plan.json"
+	if plan_path.exists():
+		return int(json.loads(plan_path.read_text(encoding="utf-8"))["shards"])
+
+	for sub in ("shards", "leases", "done"):
+		(coord_dir / sub).mkdir(parents=True, exist_ok=True)
 
+	# 防止两个节点同时规划
+	lock_path = coord_dir / "plan.lock"
+	try:
+		fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+	except FileExistsError:
+		raise RuntimeError(f"另一个节点正在规划分片: {lock_path}")
+	os.close(fd)
 
-class WorkerThread(QThread):
-    """Background thread for processing images."""
-    progress = pyqtSignal(int)
-    log_message = pyqtSignal(str)
-    finished_job = pyqtSignal(int, int)  # successes, failures
+	try:
+		roots = _input_roots(paths)
+		if len(roots) > 1 and len({r.name for r in roots}) != len(roots):
+			raise RuntimeError("多个输入目录同名，输出路径会冲突，请分别规划")
+		files = [p.resolve() for p in gather_images(paths)]
+		shards = partition_shards(files, shard_size)
+		for idx, shard in enumerate(shards):
+			_write_atomic(coord_dir / "shards" / f"{idx:06d}.txt", "".join(f"{p}\n" for p in shard))
+		_write_atomic(plan_path, json.dumps({
+			"shards": len(shards),
+			"files": len(files),
+			"shard_size": shard_size,
+			"roots": [str(r) for r in roots],  # 节点据此在输出目录中镜像相对路径
+			"created": time.time(),
+		}))
+		return len(shards)
+	finally:
+		lock_path.unlink(missing_ok=True)
+
+
+def _current_lease(lease_dir: Path, shard_id: str) -> Tuple[int, Optional[Path]]:
+	"""Return (generation, path) of the newest lease for *shard_id*, or (0, None)."""
+	best_gen, best_path = 0, None
+	for p in lease_dir.glob(f"{shard_id}.*.lease"):
+		try:
+			gen = int(p.name.split(".")[1])
+		except (IndexError, ValueError):
+			continue
+		if gen > best_gen:
+			best_gen, best_path = gen, p
+	return best_gen, best_path
+
+
+def _try_claim_shard(lease_dir: Path, shard_id: str, node_id: str, ttl: float) -> Optional[Path]:
+	"""Try to take the lease on *shard_id*; returns our lease path on success."""
+	gen, current = _current_lease(lease_dir, shard_id)
+	if current is not None:
+		try:
+			age = time.time() - current.stat().st_mtime
+		except FileNotFoundError:
+			return None
+		if age < ttl:
+			return None  # 其他节点仍持有有效租约
+
+	# 下一代租约文件只能被一个节点创建成功，因此过期接管也不会出现双重领取
+	lease_path = lease_dir / f"{shard_id}.{gen + 1}.lease"
+	try:
+		fd = os.open(str(lease_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+	except FileExistsError:
+		return None
+	with os.fdopen(fd, "w", encoding="utf-8") as fh:
+		fh.write(json.dumps({"node": node_id, "pid": os.getpid(), "claimed": time.time()}))
+	return lease_path
+
+
+def _lease_heartbeat(lease_path: Path, interval: float, stop: threading.Event, lost: threading.Event) -> None:
+	"""Refresh the lease mtime until *stop* is set; set *lost* if another node took over."""
+	shard_id, gen = lease_path.name.split(".")[:2]
+	while not stop.wait(interval):
+		current_gen, _ = _current_lease(lease_path.parent, shard_id)
+		if current_gen != int(gen):
+			# 心跳不及时导致租约被接管，继续处理会与新持有者同时写同一批输出
+			lost.set()
+			return
+		try:
+			os.utime(str(lease_path), None)
+		except OSError:
+			pass
+
+
+def run_shard_worker(
+	coord_dir: Path,
+	config: JobConfig,
+	node_id: Optional[str] = None,
+	lease_ttl: float = SHARD_LEASE_TTL,
+	poll_interval: float = SHARD_POLL_INTERVAL,
+	log: Callable[[str], None] = print,
+) -> Tuple[int, int]:
+	"""Claim and process shards from *coord_dir* until every shard is done.
+
+	Each claimed shard is cleaned with a local pool of ``config.workers`` worker
+	processes; outputs mirror the planned input roots under ``config.output_dir``.
+	A shard whose lease is taken over mid-way is abandoned to the new owner.
+	Returns (successes, failures) for the shards processed by this node.
+	"""
+	plan_path = coord_dir / "plan.json"
+	while not plan_path.exists():
+		log(f"等待分片计划: {plan_path}")
+		time.sleep(poll_interval)
+	plan = json.loads(plan_path.read_text(encoding="utf-8"))
+	total = int(plan["shards"])
+	config = dataclasses.replace(config, input_roots=tuple(Path(r) for r in plan.get("roots", ())))
+
+	node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+	lease_dir = coord_dir / "leases"
+	done_dir = coord_dir / "done"
+	quarantine_dir = coord_dir / "quarantine"
+	shard_ids = [f"{i:06d}" for i in range(total)]
+	successes = failures = 0
+
+	while True:
+		pending = [s for s in shard_ids if not (done_dir / f"{s}.done").exists()]
+		if not pending:
+			break
+
+		claimed = None
+		for shard_id in pending:
+			lease_path = _try_claim_shard(lease_dir, shard_id, node_id, lease_ttl)
+			if lease_path is not None:
+				claimed = (shard_id, lease_path)
+				break
+
+		if claimed is None:
+			# 剩余分片都被其他节点持有，等待完成或租约过期
+			time.sleep(poll_interval)
+			continue
+
+		shard_id, lease_path = claimed
+		if (done_dir / f"{shard_id}.done").exists():
+			# 领取期间其他节点刚好完成了该分片
+			lease_path.unlink(missing_ok=True)
+			continue
+		manifest = (coord_dir / "shards" / f"{shard_id}.txt").read_text(encoding="utf-8")
+		files = [Path(line) for line in manifest.splitlines() if line]
+		log(f"[{node_id}] 领取分片 {shard_id}（{len(files)} 个文件）")
+
+		stop = threading.Event()
+		lost = threading.Event()
+		heartbeat = threading.Thread(target=_lease_heartbeat, args=(lease_path, lease_ttl / 3, stop, lost), daemon=True)
+		heartbeat.start()
+		shard_ok = shard_fail = 0
+		quarantined = []
+		try:
+			for res in iter_clean_results(files, config):
+				if lost.is_set():
+					break
+				log(res.message)
+				if res.ok:
+					shard_ok += 1
+				else:
+					shard_fail += 1
+				if res.quarantine_reason:
+					quarantined.append(f"{res.path}\t{res.quarantine_reason}\n")
+		finally:
+			stop.set()
+			heartbeat.join()
+
+		if lost.is_set():
+			log(f"[{node_id}] 分片 {shard_id} 的租约已被其他节点接管，放弃本节点的处理")
+			continue
+		if quarantined:
+			# 每个节点写自己的隔离清单，避免多节点并发追加同一文件
+			quarantine_dir.mkdir(exist_ok=True)
+			with open(quarantine_dir / f"{node_id}.tsv", "a", encoding="utf-8") as fh:
+				fh.writelines(quarantined)
+		_write_atomic(done_dir / f"{shard_id}.done", json.dumps({
+			"node": node_id,
+			"successes": shard_ok,
+			"failures": shard_fail,
+			"quarantined": len(quarantined),
+			"finished": time.time(),
+		}))
+		lease_path.unlink(missing_ok=True)
+		successes += shard_ok
+		failures += shard_fail
+		log(f"[{node_id}] 分片 {shard_id} 完成: 成功 {shard_ok}, 失败 {shard_fail}")
+
+	return successes, failures
+
+
+# --------------------------- HTTP 服务 ---------------------------
+#
+# 常驻进程对外提供清理/检测接口，省去每次上传都要重新启动解释器、导入依赖、查找工具的开销：
+#
+#   POST /clean?format=原格式|JPG|PNG&ffmpeg=0|1   请求体为图片，响应体为清理后的图片
+#   POST /detect                                  请求体为图片，响应 JSON 检测结果
+#   GET  /health                                  健康检查
+#
+# 同时处理的请求数受线程池大小限制，排队数超过 max_pending 或已接纳请求体的总字节数
+# 超过 max_inflight_bytes 时直接返回 503，由调用方退避重试（背压），而不是无限堆积。
+# 每个请求在受看门狗保护的工作进程中执行，超过 request_timeout 的进程连同其外部工具一起被终止并替换。
+
+SERVER_MAX_BODY = 50 * 1024 * 1024  # 单个请求体上限
+SERVER_MAX_PENDING = 64
+SERVER_MAX_INFLIGHT_BYTES = 512 * 1024 * 1024  # 所有已接纳请求体占用的内存上限
+SERVER_REQUEST_TIMEOUT = 120.0  # 秒
+SERVER_CHUNK_SIZE = 256 * 1024
+
+_CONTENT_TYPES = {
+	".jpg": "image/jpeg",
+	".jpeg": "image/jpeg",
+	".png": "image/png",
+	".webp": "image/webp",
+	".tif": "image/tiff",
+	".tiff": "image/tiff",
+	".bmp": "image/bmp",
+}
+
+_HTTP_REASONS = {
+	200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+	411: "Length Required", 413: "Payload Too Large", 415: "Unsupported Media Type",
+	422: "Unprocessable Entity", 431: "Request Header Fields Too Large",
+	503: "Service Unavailable", 504: "Gateway Timeout",
+}
 
-    def __init__(self, files, config):
-        super().__init__()
-        self.files = files
-        self.config = config
 
-    def run(self):
-        successes = 0
-        failures = 0
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class CleanServer:
+    """asyncio HTTP server exposing clean_one_image / detect_ai_generated_metadata."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        workers: int = 4,
+        max_pending: int = SERVER_MAX_PENDING,
+        max_body: int = SERVER_MAX_BODY,
+        max_inflight_bytes: int = SERVER_MAX_INFLIGHT_BYTES,
+        prefer_ffmpeg: bool = False,
+        request_timeout: float = SERVER_REQUEST_TIMEOUT,
+    ):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.max_inflight_bytes = max_inflight_bytes
+        self.prefer_ffmpeg = prefer_ffmpeg
+        self.request_timeout = request_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clearmeta")
+        self._pending = 0  # 已接纳但尚未完成的请求数（含排队和已超时仍在执行的）
+        self._inflight_bytes = 0  # 这些请求的请求体字节数
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 每个执行器线程独占一个受看门狗保护的工作进程，卡死的任务会连同进程被终止替换
+        self._local = threading.local()
+        self._pools: List[GuardedPool] = []
+        self._pools_lock = threading.Lock()
+        self._seq = itertools.count()
+        # 优先放在内存文件系统上，减少临时文件的磁盘 IO
+        shm = Path("/dev/shm")
+        base = str(shm) if shm.is_dir() and os.access(str(shm), os.W_OK) else None
+        self._tmpdir = Path(tempfile.mkdtemp(prefix="clearmeta-", dir=base))
+
+    def warm_up(self) -> None:
+        """Load Pillow plugins, resolve external tools and start pool threads and worker processes up front."""
+        Image.init()
+        calibrate_engines()
+        # 屏障让每个线程恰好领到一个预热任务，各自启动自己的工作进程
+        barrier = threading.Barrier(self.workers)
+        for fut in [self._executor.submit(self._warm_thread, barrier) for _ in range(self.workers)]:
+            fut.result()
+
+    def _warm_thread(self, barrier: threading.Barrier) -> None:
+        self._thread_pool()
+        barrier.wait()
+
+    def _thread_pool(self) -> "GuardedPool":
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            pool = self._local.pool = GuardedPool(1)
+            with self._pools_lock:
+                self._pools.append(pool)
+        return pool
+
+    def _run_guarded(self, func: Callable, args: tuple):
+        """Run ``func(*args)`` in this thread's worker process, killing it after request_timeout."""
+        started = time.monotonic()
+        _, result, reason = next(self._thread_pool().run([(None, func, args, self.request_timeout)]))
+        if reason is None:
+            return result
+        if time.monotonic() - started >= self.request_timeout:
+            raise _HttpError(504, "processing timed out")
+        raise _HttpError(422, reason)
+
+    async def serve_forever(self) -> None:
+        self.warm_up()
+        self._loop = asyncio.get_running_loop()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f"ClearMeta HTTP 服务已启动: http://{self.host}:{self.port}")
         try:
-            with ThreadPoolExecutor(max_workers=self.config.workers) as ex:
-                fut_to_file = {}
-                for i, f in enumerate(self.files):
-                    if self.config.overwrite:
-                        out = f
-                    else:
-                        out_base = self.config.output_dir or f.parent
-                        out = out_base / f.name
-                    fut = ex.submit(clean_one_image, f, out, self.config.use_ffmpeg, self.config.output_format)
-                    fut_to_file[fut] = (f, i)
-
-                for fut in as_completed(fut_to_file):
-                    f, i = fut_to_file[fut]
-                    ok, msg = fut.result()
-                    self.log_message.emit(msg)
-                    if ok:
-                        successes += 1
-                    else:
-                        failures += 1
-                    self.progress.emit(i + 1)
-        except Exception:
-            self.log_message.emit("发生错误:\n" + traceback.format_exc())
+            async with server:
+                await server.serve_forever()
         finally:
-            self.finished_job.emit(successes, failures)
+            self._executor.shutdown(wait=False)
+            for pool in self._pools:
+                pool.close()
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
 
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_head(reader)
+                except _HttpError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, resp_headers, body = await self._dispatch(method, target, headers, reader, writer)
+                except _HttpError as e:
+                    # 请求体可能尚未读取，无法继续复用该连接
+                    await self._send_json(writer, e.status, {"error": e.message}, keep_alive=False,
+                                          extra_headers={"Retry-After": "1"} if e.status == 503 else None)
+                    break
+                await self._send(writer, status, resp_headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader: asyncio.StreamReader):
+        """Read the request line and headers; returns None on a cleanly closed connection."""
+        # 单行超过 StreamReader 的缓冲上限时 readline 抛 ValueError
+        try:
+            line = await reader.readline()
+        except ValueError:
+            raise _HttpError(400, "request line too long")
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise _HttpError(400, "malformed request line")
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise _HttpError(431, "header line too long")
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= 100:
+                raise _HttpError(400, "too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return method.upper(), target, headers
+
+    def _content_length(self, headers: dict) -> int:
+        if "content-length" not in headers:
+            raise _HttpError(411, "Content-Length required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise _HttpError(400, "invalid Content-Length")
+        if length < 0:
+            raise _HttpError(400, "invalid Content-Length")
+        if length > self.max_body:
+            raise _HttpError(413, f"body exceeds {self.max_body} bytes")
+        return length
+
+    async def _read_body(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: dict, length: int) -> bytes:
+        if headers.get("expect", "").lower() == "100-continue":
+            # curl 对较大的请求体会先等待 100 Continue（否则约 1 秒后才上传）
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+            await writer.drain()
+        return await reader.readexactly(length)
+
+    async def _dispatch(self, method: str, target: str, headers: dict,
+                        reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        url = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path == "/health":
+            if method != "GET":
+                raise _HttpError(405, "use GET")
+            return 200, {"Content-Type": "application/json"}, json.dumps(
+                {"status": "ok", "pending": self._pending, "workers": self.workers}).encode()
+
+        if url.path not in ("/clean", "/detect"):
+            raise _HttpError(404, "unknown endpoint")
+        if method != "POST":
+            raise _HttpError(405, "use POST")
+
+        # 背压：在读取请求体（和回复 100 Continue）之前拒绝，避免为注定排不上队的请求缓冲数据
+        length = self._content_length(headers)
+        if self._pending >= self.max_pending or self._inflight_bytes + length > self.max_inflight_bytes:
+            raise _HttpError(503, "server busy")
+        self._pending += 1
+        self._inflight_bytes += length
+        submitted = False
+        try:
+            data = await self._read_body(reader, writer, headers, length)
+            try:
+                job = self._build_job(url.path, query, data)
+                fut = self._executor.submit(job)
+                # 槽位只在执行器任务真正结束时释放：超时返回 504 后线程仍在运行，仍需计入背压
+                fut.add_done_callback(functools.partial(self._release_slot, length))
+                submitted = True
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(fut), self.request_timeout)
+                except asyncio.TimeoutError:
+                    raise _HttpError(504, "processing timed out")
+            except _HttpError as e:
+                # 请求体已读完，连接仍可复用，直接返回错误响应
+                return e.status, {"Content-Type": "application/json"}, json.dumps(
+                    {"error": e.message}, ensure_ascii=False).encode("utf-8")
+        finally:
+            if not submitted:
+                self._release(length)
+
+    def _release_slot(self, length: int, _fut) -> None:
+        """Done callback of an executor job; may run on a pool thread."""
+        try:
+            self._loop.call_soon_threadsafe(self._release, length)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    def _release(self, length: int) -> None:
+        self._pending -= 1
+        self._inflight_bytes -= length
+
+    def _build_job(self, path: str, query: dict, data: bytes):
+        ext = _sniff_image_ext(data)
+        if ext is None:
+            raise _HttpError(415, "unsupported image format")
+
+        if path == "/detect":
+            job = functools.partial(self._detect_bytes, data, ext)
+        else:
+            output_format = query.get("format", ["原格式"])[0]
+            if output_format not in ("原格式", "JPG", "PNG"):
+                raise _HttpError(400, "format must be 原格式, JPG or PNG")
+            prefer_ffmpeg = query.get("ffmpeg", ["1" if self.prefer_ffmpeg else "0"])[0] == "1"
+            job = functools.partial(self._clean_bytes, data, ext, output_format, prefer_ffmpeg)
+        return job
+
+    def _scratch_paths(self, ext: str) -> Tuple[Path, Path]:
+        n = next(self._seq)
+        return self._tmpdir / f"{n}-in{ext}", self._tmpdir / f"{n}-out{ext}"
+
+    def _clean_bytes(self, data: bytes, ext: str, output_format: str, prefer_ffmpeg: bool):
+        inp, outp = self._scratch_paths(ext)
+        outp = _output_path_with_format(outp, output_format)
+        try:
+            inp.write_bytes(data)
+            # 外部工具的超时短于进程截止时间，正常情况下由工具自己超时退出
+            ok, msg, reason = self._run_guarded(
+                _clean_task, (inp, outp, prefer_ffmpeg, output_format, self.request_timeout * TOOL_TIMEOUT_FRACTION))
+            if not ok:
+                raise _HttpError(422, reason or msg)
+            body = outp.read_bytes()
+        finally:
+            inp.unlink(missing_ok=True)
+            outp.unlink(missing_ok=True)
+            _remove_tool_temps(outp)
+        return 200, {
+            "Content-Type": _CONTENT_TYPES.get(outp.suffix, "application/octet-stream"),
+            "X-ClearMeta-Message": urllib.parse.quote(msg),
+        }, body
+
+    def _detect_bytes(self, data: bytes, ext: str):
+        inp, _ = self._scratch_paths(ext)
+        try:
+            inp.write_bytes(data)
+            result = self._run_guarded(_detect_task, (inp,))
+        finally:
+            inp.unlink(missing_ok=True)
+        if len(result) != 2:
+            # 工作进程内抛出异常时返回的是 (False, msg, None)
+            raise _HttpError(422, result[1])
+        is_ai, markers = result
+        return 200, {"Content-Type": "application/json"}, json.dumps(
+            {"ai_generated": is_ai, "markers": markers}, ensure_ascii=False).encode("utf-8")
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, headers: dict, body: bytes, keep_alive: bool) -> None:
+        head = [f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}"]
+        headers = dict(headers)
+        headers["Content-Length"] = str(len(body))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        head += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        # 分块写出并等待 drain，慢客户端不会让响应无限堆积在内存中
+        view = memoryview(body)
+        for start in range(0, len(view), SERVER_CHUNK_SIZE):
+            writer.write(view[start:start + SERVER_CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload: dict, keep_alive: bool, extra_headers: Optional[dict] = None) -> None:
+        headers = {"Content-Type": "application/json"}
+        headers.update(extra_headers or {})
+        await self._send(writer, status, headers, json.dumps(payload, ensure_ascii=False).encode("utf-8"), keep_alive)
 
-@dataclass
-class JobConfig:
-    overwrite: bool
-    output_dir: Optional[Path]
-    use_ffmpeg: bool
-    output_format: str = "原格式"  # "原格式", "JPG", "PNG"
-    workers: int = 4
+
+# --------------------------- GUI ---------------------------
 
 
 if QT_AVAILABLE:
+    class WorkerThread(QThread):
+        """Background thread for processing images."""
+        progress = pyqtSignal(int)
+        log_message = pyqtSignal(str)
+        quarantined = pyqtSignal(str, str)  # path, reason
+        finished_job = pyqtSignal(int, int)  # successes, failures
+
+        def __init__(self, files, config):
+            super().__init__()
+            self.files = files
+            self.config = config
+
+        def run(self):
+            successes = 0
+            failures = 0
+            try:
+                for res in iter_clean_results(self.files, self.config):
+                    self.log_message.emit(res.message)
+                    if res.ok:
+                        successes += 1
+                    else:
+                        failures += 1
+                    if res.quarantine_reason:
+                        self.quarantined.emit(str(res.path), res.quarantine_reason)
+                    self.progress.emit(res.index + 1)
+            except Exception:
+                self.log_message.emit("发生错误:\n" + traceback.format_exc())
+            finally:
+                self.finished_job.emit(successes, failures)
+
+    class ExifLoaderThread(QThread):
+        """Background EXIF extraction; newer requests replace stale ones that have not started."""
+        info_ready = pyqtSignal(object, object, int)  # path, info, generation
+
+        def __init__(self, cache: BoundedLRUCache):
+            super().__init__()
+            self.cache = cache
+            self._cond = threading.Condition()
+            self._pending: List[Tuple[Path, int]] = []
+            self._stopped = False
+
+        def request(self, paths: List[Path], generation: int):
+            """Queue *paths* (current selection first, then prefetch), dropping older requests."""
+            with self._cond:
+                self._pending = [(p, generation) for p in paths]
+                self._cond.notify()
+
+        def stop(self):
+            with self._cond:
+                self._stopped = True
+                self._pending = []
+                self._cond.notify()
+
+        def run(self):
+            while True:
+                with self._cond:
+                    while not self._pending and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        return
+                    path, generation = self._pending.pop(0)
+
+                stamp = _file_stamp(path)
+                entry = self.cache.get(str(path))
+                if entry is not None and entry[0] == stamp:
+                    info = entry[1]
+                else:
+                    info = extract_exif_info(path)
+                    if stamp:
+                        self.cache.put(str(path), (stamp, info))
+                self.info_ready.emit(path, info, generation)
+
+    class ThumbnailLoader(QObject):
+        """Render thumbnails on a small thread pool, backed by memory and disk caches."""
+        thumbnail_ready = pyqtSignal(object, object, int)  # path, bytes or None, generation
+
+        def __init__(self, memory_cache: BoundedLRUCache, disk_cache: ThumbnailCache, workers: int = 2):
+            super().__init__()
+            self.memory_cache = memory_cache
+            self.disk_cache = disk_cache
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+            self._futures = []
+
+        def request(self, paths: List[Path], generation: int):
+            """Render *paths* in order, cancelling queued work from earlier selections."""
+            for fut in self._futures:
+                fut.cancel()
+            self._futures = [self._executor.submit(self._load, p, generation) for p in paths]
+
+        def shutdown(self):
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        def _load(self, file_path: Path, generation: int):
+            data = None
+            stamp = _file_stamp(file_path)
+            try:
+                entry = self.memory_cache.get(str(file_path))
+                if entry is not None and entry[0] == stamp:
+                    data = entry[1]
+                elif stamp and _precheck_image(file_path) is None:
+                    disk_key = _thumbnail_disk_key(file_path, THUMBNAIL_SIZE)
+                    data = self.disk_cache.get(disk_key)
+                    if data is None:
+                        data = render_thumbnail(file_path, THUMBNAIL_SIZE)
+                        self.disk_cache.put(disk_key, data)
+                    self.memory_cache.put(str(file_path), (stamp, data))
+            except Exception:
+                data = None
+            self.thumbnail_ready.emit(file_path, data, generation)
+
     class ClearMetaApp(QMainWindow):
         def __init__(self):
             super().__init__()
@@ -522,6 +2436,23 @@ if QT_AVAILABLE:
             
             self.selected_files: List[Path] = []
             self.worker_thread = None
+            self.quarantine: List[Tuple[Path, str]] = []  # 最近一次清理中被隔离的文件及原因
+            
+            # EXIF 在后台线程读取，按 (路径, mtime) 缓存，并预取相邻行
+            self.exif_cache = BoundedLRUCache(EXIF_CACHE_MAX_BYTES, lambda entry: _exif_info_size(entry[1]))
+            self.exif_generation = 0
+            self.shown_exif = None  # 当前显示的对象，后台复核结果未变时不重绘
+            self.shown_thumbnail = None
+            self.exif_loader = ExifLoaderThread(self.exif_cache)
+            self.exif_loader.info_ready.connect(self.on_exif_ready)
+            self.exif_loader.start()
+            
+            # 缩略图：内存 LRU + 磁盘缓存（小文件按全文哈希，大文件按大小、mtime 与首尾采样），后台线程池解码
+            self.thumbnail_loader = ThumbnailLoader(
+                BoundedLRUCache(THUMBNAIL_MEMORY_CACHE_BYTES, lambda entry: len(entry[1])),
+                ThumbnailCache(_app_cache_dir() / "thumbnails"),
+            )
+            self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
             
             # Enable drag and drop
             self.setAcceptDrops(True)
@@ -629,6 +2560,14 @@ if QT_AVAILABLE:
             right_widget = QWidget()
             right_layout = QVBoxLayout(right_widget)
             
+            preview_group = QGroupBox("预览")
+            preview_layout = QVBoxLayout(preview_group)
+            self.preview_label = QLabel("未选择图片")
+            self.preview_label.setAlignment(Qt.AlignCenter)
+            self.preview_label.setMinimumSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE * 3 // 4)
+            preview_layout.addWidget(self.preview_label)
+            right_layout.addWidget(preview_group)
+            
             exif_group = QGroupBox("EXIF 信息")
             exif_layout = QVBoxLayout(exif_group)
             self.exif_tree = QTreeWidget()
@@ -759,39 +2698,109 @@ if QT_AVAILABLE:
             self.selected_files.clear()
             self.file_list.clear()
             self.exif_tree.clear()
+            self.exif_generation += 1
+            self.exif_loader.request([], self.exif_generation)
+            self.thumbnail_loader.request([], self.exif_generation)
+            self.preview_label.clear()
+            self.preview_label.setText("未选择图片")
+
+        def closeEvent(self, event):
+            self.thumbnail_loader.shutdown()
+            self.exif_loader.stop()
+            self.exif_loader.wait()
+            super().closeEvent(event)
 
         def on_file_selected(self, current, previous):
             """Handle file selection and show EXIF info."""
             self.exif_tree.clear()
+            self.exif_generation += 1
+            self.shown_exif = self.shown_thumbnail = None
             
             if current is None:
+                self.exif_loader.request([], self.exif_generation)
+                self.thumbnail_loader.request([], self.exif_generation)
                 return
                 
             current_row = self.file_list.row(current)
             if 0 <= current_row < len(self.selected_files):
                 file_path = self.selected_files[current_row]
                 
-                # Extract and display EXIF info
-                exif_info = extract_exif_info(file_path)
+                # 按路径查缓存，命中直接显示；GUI 线程不 stat()，慢速网络盘也不会卡住界面。
+                # 当前文件总是再交给后台线程按 mtime/大小复核，文件被修改过时再刷新
+                entry = self.exif_cache.get(str(file_path))
+                if entry is not None:
+                    self.show_exif_info(entry[1])
+                else:
+                    self.exif_tree.addTopLevelItem(QTreeWidgetItem(["加载中…", ""]))
                 
-                for key, value in exif_info.items():
-                    item = QTreeWidgetItem([key, str(value)])
-                    
-                    # 高亮显示重要的元数据信息
-                    if key.startswith('📝 PNGINFO') or key.startswith('🎨 AI_') or key.startswith('📋 PNG Info'):
-                        # PNG info 相关条目使用特殊颜色
-                        item.setBackground(0, Qt.lightGray)
-                        item.setBackground(1, Qt.lightGray)
-                    elif key.startswith('🤖') or key.startswith('🔍'):
-                        # AI 检测相关信息使用高亮色
-                        item.setBackground(0, Qt.yellow)
-                        item.setBackground(1, Qt.yellow)
-                    
-                    self.exif_tree.addTopLevelItem(item)
+                # 预取下一行和上一行，方向键浏览时可以直接命中缓存
+                neighbours = [
+                    self.selected_files[row] for row in (current_row + 1, current_row - 1)
+                    if 0 <= row < len(self.selected_files)
+                ]
+                self.exif_loader.request([file_path] + neighbours, self.exif_generation)
                 
-                # Auto-resize columns
-                self.exif_tree.resizeColumnToContents(0)
-                self.exif_tree.resizeColumnToContents(1)
+                entry = self.thumbnail_loader.memory_cache.get(str(file_path))
+                if entry is not None:
+                    self.show_thumbnail(entry[1])
+                else:
+                    self.preview_label.clear()
+                    self.preview_label.setText("加载中…")
+                self.thumbnail_loader.request([file_path] + neighbours, self.exif_generation)
+
+        def on_exif_ready(self, file_path, exif_info, generation):
+            """Show EXIF info delivered by the loader if it is still for the current selection."""
+            if generation != self.exif_generation:
+                return
+            current_row = self.file_list.currentRow()
+            if not (0 <= current_row < len(self.selected_files)) or self.selected_files[current_row] != file_path:
+                return  # 预取结果，已写入缓存
+            if exif_info is self.shown_exif:
+                return  # 复核后缓存仍然有效
+            self.exif_tree.clear()
+            self.show_exif_info(exif_info)
+
+        def on_thumbnail_ready(self, file_path, data, generation):
+            """Show a rendered thumbnail if it belongs to the current selection."""
+            if generation != self.exif_generation:
+                return
+            current_row = self.file_list.currentRow()
+            if not (0 <= current_row < len(self.selected_files)) or self.selected_files[current_row] != file_path:
+                return
+            if data is None:
+                self.shown_thumbnail = None
+                self.preview_label.clear()
+                self.preview_label.setText("无法预览")
+            elif data is not self.shown_thumbnail:
+                self.show_thumbnail(data)
+
+        def show_thumbnail(self, data: bytes):
+            self.shown_thumbnail = data
+            pixmap = QPixmap()
+            pixmap.loadFromData(data)
+            self.preview_label.setPixmap(pixmap)
+
+        def show_exif_info(self, exif_info: dict):
+            """Fill the EXIF tree from an info dict."""
+            self.shown_exif = exif_info
+            for key, value in exif_info.items():
+                item = QTreeWidgetItem([key, str(value)])
+                
+                # 高亮显示重要的元数据信息
+                if key.startswith('📝 PNGINFO') or key.startswith('🎨 AI_') or key.startswith('📋 PNG Info'):
+                    # PNG info 相关条目使用特殊颜色
+                    item.setBackground(0, Qt.lightGray)
+                    item.setBackground(1, Qt.lightGray)
+                elif key.startswith('🤖') or key.startswith('🔍'):
+                    # AI 检测相关信息使用高亮色
+                    item.setBackground(0, Qt.yellow)
+                    item.setBackground(1, Qt.yellow)
+                
+                self.exif_tree.addTopLevelItem(item)
+            
+            # Auto-resize columns
+            self.exif_tree.resizeColumnToContents(0)
+            self.exif_tree.resizeColumnToContents(1)
 
         def start_clean(self):
             if not self.selected_files:
@@ -815,11 +2824,13 @@ if QT_AVAILABLE:
             self.progress_bar.setValue(0)
             self.status_label.setText(f"0/{len(self.selected_files)}")
             self.log("开始清理…")
+            self.quarantine = []
             self.start_btn.setEnabled(False)
 
             self.worker_thread = WorkerThread(self.selected_files, config)
             self.worker_thread.progress.connect(self.update_progress)
             self.worker_thread.log_message.connect(self.log)
+            self.worker_thread.quarantined.connect(self.on_quarantined)
             self.worker_thread.finished_job.connect(self.job_finished)
             self.worker_thread.start()
 
@@ -827,8 +2838,15 @@ if QT_AVAILABLE:
             self.progress_bar.setValue(value)
             self.status_label.setText(f"{value}/{len(self.selected_files)}")
 
+        def on_quarantined(self, path, reason):
+            self.quarantine.append((Path(path), reason))
+
         def job_finished(self, successes, failures):
             self.log(f"完成: 成功 {successes}, 失败 {failures}")
+            if self.quarantine:
+                self.log(f"隔离 {len(self.quarantine)} 个异常文件（未处理，请人工检查）:")
+                for path, reason in self.quarantine:
+                    self.log(f"  {path}: {reason}")
             self.start_btn.setEnabled(True)
             self.worker_thread = None
 
@@ -853,7 +2871,91 @@ if QT_AVAILABLE:
 else:
     class ClearMetaApp:  # minimal placeholder for headless imports/tests
         pass
+CLI_COMMANDS = ("shard-plan", "shard-work", "serve", "calibrate")
+
+
+def _add_job_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--overwrite", action="store_true", help="覆盖原文件")
+    parser.add_argument("--output-dir", type=Path, help="输出目录（未指定 --overwrite 时必填）")
+    parser.add_argument("--ffmpeg", action="store_true", help="优先使用 FFmpeg")
+    parser.add_argument("--format", default="原格式", choices=["原格式", "JPG", "PNG"], help="输出格式")
+    parser.add_argument("--workers", type=int, default=4, help="本机并发数")
+
+
+def _job_config_from_args(args: argparse.Namespace) -> JobConfig:
+    if not args.overwrite and not args.output_dir:
+        raise SystemExit("未指定 --overwrite 且未设置 --output-dir")
+    return JobConfig(
+        overwrite=args.overwrite,
+        output_dir=args.output_dir,
+        use_ffmpeg=args.ffmpeg,
+        output_format=args.format,
+        workers=args.workers,
+    )
+
+
+def run_cli(argv: List[str]) -> int:
+    """Headless entry point: ``python main.py <command> ...``."""
+    parser = argparse.ArgumentParser(prog="ClearMeta", description=APP_NAME)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    plan = sub.add_parser("shard-plan", help="扫描输入并在共享目录中生成分片计划")
+    plan.add_argument("--coord", type=Path, required=True, help="共享协调目录")
+    plan.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="每个分片的文件数")
+    plan.add_argument("inputs", nargs="+", type=Path, help="图片文件或文件夹")
+
+    work = sub.add_parser("shard-work", help="领取并处理分片，直到全部完成")
+    work.add_argument("--coord", type=Path, required=True, help="共享协调目录")
+    work.add_argument("--node-id", help="节点标识（默认 主机名-进程号）")
+    work.add_argument("--lease-ttl", type=float, default=SHARD_LEASE_TTL, help="租约过期时间（秒）")
+    _add_job_arguments(work)
+
+    serve = sub.add_parser("serve", help="启动本地 HTTP 清理服务")
+    serve.add_argument("--host", default="127.0.0.1", help="监听地址")
+    serve.add_argument("--port", type=int, default=8765, help="监听端口")
+    serve.add_argument("--workers", type=int, default=4, help="同时处理的请求数")
+    serve.add_argument("--max-pending", type=int, default=SERVER_MAX_PENDING, help="排队上限，超出返回 503")
+    serve.add_argument("--ffmpeg", action="store_true", help="默认优先使用 FFmpeg")
+
+    sub.add_parser("calibrate", help="重新探测外部工具并测量各引擎速度")
+
+    args = parser.parse_args(argv)
+    if args.command == "shard-plan":
+        count = prepare_shards(args.inputs, args.coord, args.shard_size)
+        print(f"分片计划就绪: {count} 个分片 -> {args.coord}")
+        return 0
+    if args.command == "shard-work":
+        successes, failures = run_shard_worker(
+            args.coord, _job_config_from_args(args), node_id=args.node_id, lease_ttl=args.lease_ttl
+        )
+        print(f"完成: 成功 {successes}, 失败 {failures}")
+        return 1 if failures else 0
+    if args.command == "calibrate":
+        (_app_cache_dir() / "capabilities.json").unlink(missing_ok=True)
+        probe_capabilities.cache_clear()
+        caps = probe_capabilities()
+        print(f"FFmpeg: {caps.ffmpeg or '未找到'} {caps.ffmpeg_version}")
+        print(f"FFmpeg 编码器: {', '.join(caps.ffmpeg_encoders) or '-'}")
+        print(f"exiftool: {caps.exiftool or '未找到'} {caps.exiftool_version}")
+        print(f"jpegtran: {caps.jpegtran or '未找到'}")
+        calibrate_engines(force=True, log=print)
+        return 0
+    if args.command == "serve":
+        server = CleanServer(args.host, args.port, workers=args.workers,
+                             max_pending=args.max_pending, prefer_ffmpeg=args.ffmpeg)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return 0
+    return 2
+
+
 def main():
+    multiprocessing.freeze_support()  # 打包后的程序启动工作进程时需要
+    if len(sys.argv) > 1 and sys.argv[1] in CLI_COMMANDS:
+        sys.exit(run_cli(sys.argv[1:]))
+
     if not QT_AVAILABLE:
         print("PyQt5 不可用，GUI 无法启动。请安装 PyQt5：pip install PyQt5")
         print("仍可导入并使用 clean_one_image 函数进行脚本化清理。")